@@ -13,32 +13,30 @@
 # limitations under the License.
 # ------------------------------------------------------------------------------
 import logging
-import copy
-import time
-import random
 import os
-import binascii
-from threading import Lock
-from functools import partial
-from collections import namedtuple
+import queue
+import random
+import time
 from enum import Enum
-from functools import reduce
+from functools import partial
+from threading import Event
+from threading import Lock
 from typing import Tuple
 
 from sawtooth_validator.concurrent.thread import InstrumentedThread
+from sawtooth_validator.exceptions import PeeringException
+from sawtooth_validator.protobuf import validator_pb2
 from sawtooth_validator.protobuf.network_pb2 import DisconnectMessage
+from sawtooth_validator.protobuf.network_pb2 import GetPeersRequest
+from sawtooth_validator.protobuf.network_pb2 import GetPeersResponse
 from sawtooth_validator.protobuf.network_pb2 import GossipMessage
 from sawtooth_validator.protobuf.network_pb2 import GossipBatchByBatchIdRequest
 from sawtooth_validator.protobuf.network_pb2 import \
     GossipBatchByTransactionIdRequest
 from sawtooth_validator.protobuf.network_pb2 import GossipBlockRequest
-from sawtooth_validator.protobuf import validator_pb2
+from sawtooth_validator.protobuf.network_pb2 import NetworkAcknowledgement
 from sawtooth_validator.protobuf.network_pb2 import PeerRegisterRequest
 from sawtooth_validator.protobuf.network_pb2 import PeerUnregisterRequest
-from sawtooth_validator.protobuf.network_pb2 import GetPeersRequest
-from sawtooth_validator.protobuf.network_pb2 import GetPeersResponse
-from sawtooth_validator.protobuf.network_pb2 import NetworkAcknowledgement
-from sawtooth_validator.exceptions import PeeringException
 
 LOGGER = logging.getLogger(__name__)
 
@@ -56,11 +54,45 @@ class ConnectionStatus(Enum):
     TOPOLOGY = 2
 
 
-EndpointInfo = namedtuple('EndpointInfo',
-                          ['endpoint', 'status', 'time', "retry_threshold"])
-
-StaticPeerInfo = namedtuple('StaticPeerInfo',
-                            ['connection_id', 'time', 'retry_threshold', 'count'])
+# pylint: disable=redefined-outer-name
+class EndpointInfo:
+    """Connection attempt details of a temporary connection. retries
+    counts the attempts to the endpoint that came before this one.
+    """
+    __slots__ = ('endpoint', 'status', 'time', 'retry_threshold', 'retries')
+
+    def __init__(self, endpoint, status, time, retry_threshold, retries=0):
+        self.endpoint = endpoint
+        self.status = status
+        self.time = time
+        self.retry_threshold = retry_threshold
+        self.retries = retries
+
+    def __repr__(self):
+        return "EndpointInfo(endpoint={!r}, status={}, time={}, " \
+            "retry_threshold={}, retries={})".format(
+                self.endpoint, self.status, self.time, self.retry_threshold,
+                self.retries)
+
+
+class StaticPeerInfo:
+    """Retry state of a static peer endpoint. Updated in place by the
+    static peering loop.
+    """
+    __slots__ = ('connection_id', 'time', 'retry_threshold', 'count')
+
+    def __init__(self, connection_id, time, retry_threshold, count):
+        self.connection_id = connection_id
+        self.time = time
+        self.retry_threshold = retry_threshold
+        self.count = count
+
+    def __repr__(self):
+        return "StaticPeerInfo(connection_id={!r}, time={}, " \
+            "retry_threshold={}, count={})".format(
+                self.connection_id, self.time, self.retry_threshold,
+                self.count)
+# pylint: enable=redefined-outer-name
 
 INITIAL_RETRY_FREQUENCY = 10
 assert INITIAL_RETRY_FREQUENCY % 2 == 0
@@ -69,13 +101,56 @@ MAXIMUM_RETRY_FREQUENCY = 300
 MAXIMUM_STATIC_RETRY_FREQUENCY = 3600
 MAXIMUM_STATIC_RETRIES = 24
 
+# Number of first connection attempts still within their first retry
+# window at which no new connection to a candidate or seed endpoint is
+# opened. Endpoints that keep failing are retried by
+# _check_temp_connections and no longer count.
+MAXIMUM_PENDING_HANDSHAKES = 16
+
 TIME_TO_LIVE = 3
+# Seconds for which the sawtooth.gossip.time_to_live setting is reused
+TIME_TO_LIVE_CACHE_DURATION = 1
 
 # This is the protocol version number.  It should only be incremented when
 # there are changes to the network protocols, as well as only once per
 # release.
 NETWORK_PROTOCOL_VERSION = 1
 
+_SHUTDOWN_SENTINEL = -1
+
+# Size in bytes of the random pool that request nonces are sliced from
+NONCE_BUFFER_SIZE = 4096
+NONCE_SIZE = 16
+
+
+class _NonceBuffer:
+    """Hands out random hex nonces, refilling a pool of random bytes with
+    a single os.urandom call instead of one call per nonce.
+    """
+
+    def __init__(self, size=NONCE_BUFFER_SIZE):
+        self._lock = Lock()
+        self._size = size
+        self._buf = b''
+        self._pos = 0
+
+    def get(self, length=NONCE_SIZE):
+        with self._lock:
+            if self._pos + length > len(self._buf):
+                self._buf = os.urandom(self._size)
+                self._pos = 0
+            nonce = self._buf[self._pos:self._pos + length]
+            self._pos += length
+        return nonce.hex()
+
+
+def _next_backoff(previous, cap):
+    """Returns the next retry threshold after previous, drawn with
+    decorrelated jitter so that connections which failed together do not
+    retry in lockstep. The result never exceeds cap.
+    """
+    return min(cap, random.uniform(previous, previous * 3))
+
 
 class Gossip:
     def __init__(self, network,
@@ -145,6 +220,8 @@ class Gossip:
         self._maximum_peer_connectivity = maximum_peer_connectivity
         self._topology_check_frequency = topology_check_frequency
         self._settings_cache = settings_cache
+        # (time cached, value) of the last time_to_live setting lookup
+        self._time_to_live_cache = (None, TIME_TO_LIVE)
 
         self._current_chain_head_func = current_chain_head_func
         self._current_root_func = current_root_func
@@ -152,6 +229,21 @@ class Gossip:
 
         self._topology = None
         self._peers = {}
+        # Immutable (connection_id, endpoint) pairs, rebuilt whenever
+        # _peers changes, so readers never need the lock.
+        self._peers_snapshot = ()
+        # Connection ids of _peers_snapshot
+        self._peer_ids = ()
+        # Reverse index of _peers, endpoint:connection_id
+        self._peers_by_endpoint = {}
+        # Public keys of the peers, connection_id:public_key. A connection
+        # keeps its public key for its whole lifetime.
+        self._public_keys = {}
+        self._nonces = _NonceBuffer()
+        # (notifier function, public_key) pairs for the consensus notifier,
+        # delivered off the peering locks by the notifier thread.
+        self._notify_queue = queue.Queue()
+        self._notify_thread = None
 
     def send_peers(self, connection_id):
         """Sends a message containing our peers to the
@@ -176,16 +268,20 @@ class Gossip:
         except ValueError:
             LOGGER.debug("Connection disconnected: %s", connection_id)
 
-    def add_candidate_peer_endpoints(self, peer_endpoints):
+    def add_candidate_peer_endpoints(self, peer_endpoints,
+                                     connection_id=None):
         """Adds candidate endpoints to the list of endpoints to
         attempt to peer with.
 
         Args:
             peer_endpoints ([str]): A list of public uri's which the
                 validator can attempt to peer with.
+            connection_id (str): The connection that answered with the
+                endpoints, if they came in a GOSSIP_GET_PEERS_RESPONSE.
         """
         if self._topology:
-            self._topology.add_candidate_peer_endpoints(peer_endpoints)
+            self._topology.add_candidate_peer_endpoints(
+                peer_endpoints, connection_id=connection_id)
         else:
             LOGGER.debug("Could not add peer endpoints to topology. "
                          "ConnectionManager does not exist.")
@@ -193,28 +289,48 @@ class Gossip:
     def get_peers(self):
         """Returns a copy of the gossip peers.
         """
-        with self._lock:
-            return copy.copy(self._peers)
+        return dict(self._peers_snapshot)
+
+    def _update_peers_snapshot(self):
+        """Rebuilds the lock-free snapshot of the gossip peers.
+        Note: Needs Gossip's lock.
+        """
+        self._peers_snapshot = tuple(self._peers.items())
+        self._peer_ids = tuple(self._peers)
+
+    def _remove_peer(self, connection_id):
+        """Removes a connection_id from the peers and their indexes.
+        Note: Needs Gossip's lock.
+        """
+        endpoint = self._peers.pop(connection_id)
+        if self._peers_by_endpoint.get(endpoint) == connection_id:
+            del self._peers_by_endpoint[endpoint]
+        self._public_keys.pop(connection_id, None)
+        self._update_peers_snapshot()
 
     def _peer_to_public_key(self, peer):
         """Lockless call"""
-        return self._network.connection_id_to_public_key(peer)
+        public_key = self._public_keys.get(peer)
+        if public_key is None:
+            public_key = self._network.connection_id_to_public_key(peer)
+        return public_key
 
     def peer_to_public_key(self, peer):
-        """Returns the public key for the associated peer."""
-        with self._lock:
-            self._peer_to_public_key(peer)
+        """Returns the public key for the associated peer.
+        Reads the public key cache without taking Gossip's lock.
+        """
+        return self._peer_to_public_key(peer)
 
     def get_peers_public_keys(self):
-        """Returns the list of public keys for all peers."""
-        with self._lock:
-            # Use a generator inside the list comprehension to filter out None
-            # values in a single pass
-            return [key for key
-                    in (self._network.connection_id_to_public_key(peer)
-                        for peer
-                        in copy.copy(self._peers))
-                    if key is not None]
+        """Returns the list of public keys for all peers.
+        Reads the peers snapshot without taking Gossip's lock.
+        """
+        # Use a generator inside the list comprehension to filter out None
+        # values in a single pass
+        return [key for key
+                in (self._peer_to_public_key(peer)
+                    for peer in self._peer_ids)
+                if key is not None]
 
     @property
     def endpoint(self):
@@ -223,11 +339,11 @@ class Gossip:
         return self._endpoint
 
     def get_peers_filtered(self):
-        """Returns a copy of the gossip peers.
+        """Returns a copy of the gossip peers whose connection status is
+        PEER.
         """
-        statuses = self._topology.get_connection_statuses()
-        peers = self.get_peers()
-        return {k: v for k, v in peers.items() if statuses.get(k) == PeerStatus.PEER}
+        peer_ids = self._topology.get_peer_status_ids()
+        return {k: v for k, v in self._peers_snapshot if k in peer_ids}
 
     def _try_remove_abandoned_peers(self, endpoint: str) -> bool:
         """Remove any abandoned peers and return True if any.
@@ -239,13 +355,17 @@ class Gossip:
         Returns:
             bool: returns true (an error) if at least one abandoned peer was found and removed.
         """
-        stale_connections = [conn_id for conn_id,
-                             peer in self._peers.items() if peer == endpoint]
+        stale_connection = self._peers_by_endpoint.get(endpoint)
+        if stale_connection is not None and \
+                self._peers.get(stale_connection) != endpoint:
+            # The index entry outlived its peer, it does not block
+            del self._peers_by_endpoint[endpoint]
+            stale_connection = None
+        stale_connections = [stale_connection] if stale_connection else []
         for id_ in stale_connections:
             self._unregister_peer(id_)
             self._topology._remove_temporary_connection(id_)
-            LOGGER.debug(
-                "Abandoned peer {} ({}) removed.".format(id_[:8], endpoint))
+            LOGGER.debug("Abandoned peer %s (%s) removed.", id_, endpoint)
 
         return True if stale_connections else False
 
@@ -262,6 +382,7 @@ class Gossip:
         """
         with self._topology._lock:
             self._register_peer(connection_id, endpoint)
+        self._topology.wake()
 
     def _register_peer(self, connection_id, endpoint):
         """
@@ -272,18 +393,29 @@ class Gossip:
                 raise PeeringException(
                     "Peer rejected. {} ({}) is already connected.".format(connection_id[:8], endpoint))
             if len(self._peers) < self._maximum_peer_connectivity:
+                previous_endpoint = self._peers.get(connection_id)
+                if previous_endpoint is not None and \
+                        self._peers_by_endpoint.get(previous_endpoint) == \
+                        connection_id:
+                    del self._peers_by_endpoint[previous_endpoint]
                 self._peers[connection_id] = endpoint
+                self._peers_by_endpoint[endpoint] = connection_id
+                self._update_peers_snapshot()
                 self._topology.set_connection_status(
                     connection_id, PeerStatus.PEER)
-                LOGGER.debug("Added connection_id {} with endpoint {}, connected identities are now {}."
-                             .format(connection_id, endpoint, self._peers))
+                LOGGER.debug("Added connection_id %s with endpoint %s, "
+                             "connected identities are now %s.",
+                             connection_id, endpoint, self._peers)
             else:
                 raise PeeringException(
                     "At maximum configured number of peers: {} Rejecting peering request from {}."
                     .format(self._maximum_peer_connectivity, endpoint))
             public_key = self._peer_to_public_key(connection_id)
+            if public_key is not None:
+                self._public_keys[connection_id] = public_key
         if public_key:
-            self._consensus_notifier.notify_peer_connected(public_key)
+            self._notify_queue.put(
+                (self._consensus_notifier.notify_peer_connected, public_key))
 
     def _unregister_peer(self, connection_id):
         """Removes a connection_id from the registry.
@@ -296,8 +428,10 @@ class Gossip:
         if connection_id in self._peers:
             public_key = self._peer_to_public_key(connection_id)
             if public_key:
-                self._consensus_notifier.notify_peer_disconnected(public_key)
-            del self._peers[connection_id]
+                self._notify_queue.put(
+                    (self._consensus_notifier.notify_peer_disconnected,
+                     public_key))
+            self._remove_peer(connection_id)
             LOGGER.debug("Removed connection_id %s, "
                          "connected identities are now %s",
                          connection_id, self._peers)
@@ -318,15 +452,23 @@ class Gossip:
         with self._topology._lock:
             with self._lock:
                 self._unregister_peer(connection_id)
+        self._topology.wake()
 
     def get_time_to_live(self):
-        time_to_live = \
+        now = time.monotonic()
+        cached_at, time_to_live = self._time_to_live_cache
+        if cached_at is not None and \
+                now - cached_at < TIME_TO_LIVE_CACHE_DURATION:
+            return time_to_live
+
+        time_to_live = int(
             self._settings_cache.get_setting(
                 "sawtooth.gossip.time_to_live",
                 self._current_root_func,
                 default_value=TIME_TO_LIVE
-            )
-        return int(time_to_live)
+            ))
+        self._time_to_live_cache = (now, time_to_live)
+        return time_to_live
 
     def broadcast_block(self, block, exclude=None, time_to_live=None):
         if time_to_live is None:
@@ -336,23 +478,25 @@ class Gossip:
             content=block.SerializeToString(),
             time_to_live=time_to_live)
 
-        self.broadcast(
-            gossip_message, validator_pb2.Message.GOSSIP_MESSAGE, exclude)
+        self.broadcast_bytes(
+            gossip_message.SerializeToString(),
+            validator_pb2.Message.GOSSIP_MESSAGE,
+            exclude)
 
     def broadcast_block_request(self, block_id):
         time_to_live = self.get_time_to_live()
         block_request = GossipBlockRequest(
             block_id=block_id,
-            nonce=binascii.b2a_hex(os.urandom(16)),
+            nonce=self._nonces.get(),
             time_to_live=time_to_live)
-        self.broadcast(block_request,
-                       validator_pb2.Message.GOSSIP_BLOCK_REQUEST)
+        self.broadcast_bytes(block_request.SerializeToString(),
+                             validator_pb2.Message.GOSSIP_BLOCK_REQUEST)
 
     def send_block_request(self, block_id, connection_id):
         time_to_live = self.get_time_to_live()
         block_request = GossipBlockRequest(
             block_id=block_id,
-            nonce=binascii.b2a_hex(os.urandom(16)),
+            nonce=self._nonces.get(),
             time_to_live=time_to_live)
         self.send(validator_pb2.Message.GOSSIP_BLOCK_REQUEST,
                   block_request.SerializeToString(),
@@ -367,34 +511,35 @@ class Gossip:
             content=batch.SerializeToString(),
             time_to_live=time_to_live)
 
-        self.broadcast(
-            gossip_message, validator_pb2.Message.GOSSIP_MESSAGE, exclude)
+        self.broadcast_bytes(
+            gossip_message.SerializeToString(),
+            validator_pb2.Message.GOSSIP_MESSAGE,
+            exclude)
 
     def broadcast_batch_by_transaction_id_request(self, transaction_ids):
         time_to_live = self.get_time_to_live()
         batch_request = GossipBatchByTransactionIdRequest(
             ids=transaction_ids,
-            nonce=binascii.b2a_hex(os.urandom(16)),
+            nonce=self._nonces.get(),
             time_to_live=time_to_live)
-        self.broadcast(
-            batch_request,
+        self.broadcast_bytes(
+            batch_request.SerializeToString(),
             validator_pb2.Message.GOSSIP_BATCH_BY_TRANSACTION_ID_REQUEST)
 
     def broadcast_batch_by_batch_id_request(self, batch_id):
         time_to_live = self.get_time_to_live()
         batch_request = GossipBatchByBatchIdRequest(
             id=batch_id,
-            nonce=binascii.b2a_hex(os.urandom(16)),
+            nonce=self._nonces.get(),
             time_to_live=time_to_live)
-        self.broadcast(
-            batch_request,
+        self.broadcast_bytes(
+            batch_request.SerializeToString(),
             validator_pb2.Message.GOSSIP_BATCH_BY_BATCH_ID_REQUEST)
 
     def send_consensus_message(self, connection_id, peer_id, message):
-        connection_id_local = self._network.public_key_to_connection_id(
-            peer_id)
-        # port check
-        assert connection_id == connection_id_local
+        if __debug__:
+            # port check, compiled out under -O
+            assert self._peer_to_public_key(connection_id) == peer_id
 
         self.send(
             validator_pb2.Message.GOSSIP_MESSAGE,
@@ -405,11 +550,11 @@ class Gossip:
             connection_id)
 
     def broadcast_consensus_message(self, message):
-        self.broadcast(
+        self.broadcast_bytes(
             GossipMessage(
                 content_type=GossipMessage.CONSENSUS,
                 content=message.SerializeToString(),
-                time_to_live=self.get_time_to_live()),
+                time_to_live=self.get_time_to_live()).SerializeToString(),
             validator_pb2.Message.GOSSIP_MESSAGE)
 
     def send(self, message_type, message, connection_id, one_way=False):
@@ -424,14 +569,19 @@ class Gossip:
             self._network.send(message_type, message, connection_id,
                                one_way=one_way)
         except ValueError:
-            LOGGER.debug("Connection %s is no longer valid. "
-                         "Removing from list of peers.",
-                         connection_id)
-            with self._lock:
-                if connection_id in self._peers:
-                    del self._peers[connection_id]
+            self._remove_invalid_peer(connection_id)
+
+    def _remove_invalid_peer(self, connection_id):
+        """Drops a peer whose connection is no longer known to the network.
+        """
+        LOGGER.debug("Connection %s is no longer valid. "
+                     "Removing from list of peers.",
+                     connection_id)
+        with self._lock:
+            if connection_id in self._peers:
+                self._remove_peer(connection_id)
 
-    def broadcast(self, gossip_message, message_type, exclude=[]):
+    def broadcast(self, gossip_message, message_type, exclude=None):
         """Broadcast gossip messages.
 
         Broadcast the message to all peers unless they are in the excluded
@@ -443,16 +593,30 @@ class Gossip:
             exclude: A list of connection_ids that should be excluded from this
                 broadcast.
         """
-        if exclude is None:
-            exclude = []
-        serialized_msg = gossip_message.SerializeToString()
-        for connection_id in self.get_peers():
-            if connection_id not in exclude:
-                self.send(
-                    message_type,
-                    serialized_msg,
-                    connection_id,
-                    one_way=True)
+        self.broadcast_bytes(
+            gossip_message.SerializeToString(), message_type, exclude)
+
+    def broadcast_bytes(self, serialized_msg, message_type, exclude=None):
+        """Broadcast an already serialized gossip message.
+
+        Broadcast the message to all peers unless they are in the excluded
+        list.
+        Args:
+            serialized_msg (bytes): The serialized message to be broadcast.
+            message_type: Type of the message.
+            exclude: A list of connection_ids that should be excluded from this
+                broadcast.
+        """
+        connection_ids = self._peer_ids
+        if exclude:
+            exclude_set = frozenset(exclude)
+            connection_ids = tuple(connection_id
+                                   for connection_id in connection_ids
+                                   if connection_id not in exclude_set)
+        failed = self._network.send_many(
+            message_type, serialized_msg, connection_ids, one_way=True)
+        for connection_id in failed:
+            self._remove_invalid_peer(connection_id)
 
     def connect_success(self, connection_id):
         """
@@ -477,7 +641,22 @@ class Gossip:
             with self._topology._lock:
                 self._topology._remove_temp_connection_info(connection)
 
+    def _notify_loop(self):
+        while True:
+            item = self._notify_queue.get()
+            if item is _SHUTDOWN_SENTINEL:
+                break
+            notify, public_key = item
+            try:
+                notify(public_key)
+            except Exception:  # pylint: disable=broad-except
+                LOGGER.exception("Unable to notify consensus of peer change")
+
     def start(self):
+        self._notify_thread = InstrumentedThread(
+            target=self._notify_loop, name="GossipConsensusNotifier")
+        self._notify_thread.start()
+
         self._topology = ConnectionManager(
             gossip=self,
             network=self._network,
@@ -493,7 +672,7 @@ class Gossip:
         self._topology.start()
 
     def stop(self):
-        for peer in self.get_peers():
+        for peer in self._peer_ids:
             request = PeerUnregisterRequest()
             try:
                 self._network.send(validator_pb2.Message.GOSSIP_UNREGISTER,
@@ -503,6 +682,12 @@ class Gossip:
                 pass
         if self._topology:
             self._topology.stop()
+            # The topology thread may still unregister peers on its way
+            # out; its notifications must be queued before the sentinel.
+            if self._topology.is_alive():
+                self._topology.join()
+        # Pending notifications are delivered before the thread exits.
+        self._notify_queue.put(_SHUTDOWN_SENTINEL)
 
 
 class ConnectionManager(InstrumentedThread):
@@ -543,28 +728,42 @@ class ConnectionManager(InstrumentedThread):
         self._endpoint = endpoint
         self._current_chain_head_func = current_chain_head_func
         self._initial_peer_endpoints = initial_peer_endpoints
-        self._initial_seed_endpoints = initial_seed_endpoints
+        # Never mutated, read without the lock
+        self._initial_seed_endpoints = tuple(initial_seed_endpoints)
         self._peering_mode = peering_mode
         self._min_peers = min_peers
         self._max_peers = max_peers
         self._check_frequency = check_frequency
 
-        self._candidate_peer_endpoints = []
+        # Insertion ordered, keys are the endpoints and values unused
+        self._candidate_peer_endpoints = {}
         # Seconds to wait for messages to arrive
         self._response_duration = 5
+        # Set to run the next topology check without waiting for
+        # check_frequency
+        self._wake = Event()
+        # Connection ids whose GOSSIP_GET_PEERS_REQUEST of the current
+        # topology search is not answered yet
+        self._pending_peers_requests = set()
+        # Set when every pending GOSSIP_GET_PEERS_REQUEST is answered, or
+        # on stop
+        self._peers_response = Event()
         self._connection_statuses = {}
         self._temp_connections = {}
         self._static_peer_status = {}
+        # GetPeersRequest carries no fields, so it is serialized once
+        self._get_peers_request_bytes = GetPeersRequest().SerializeToString()
 
     def start(self):
         endpoints = set(self._initial_peer_endpoints) - set([self._endpoint])
-        for endpoint in endpoints:
-            self._static_peer_status[endpoint] = \
-                StaticPeerInfo(
-                    None,
-                    time=0,
-                    retry_threshold=INITIAL_RETRY_FREQUENCY/2,
-                    count=0)
+        self._static_peer_status = {
+            endpoint: StaticPeerInfo(
+                None,
+                time=0,
+                retry_threshold=INITIAL_RETRY_FREQUENCY/2,
+                count=0)
+            for endpoint in endpoints
+        }
 
         super().start()
 
@@ -593,12 +792,22 @@ class ConnectionManager(InstrumentedThread):
 
                         self._request_chain_head(peered_connections)
 
-                time.sleep(self._check_frequency)
             except Exception:  # pylint: disable=broad-except
                 LOGGER.exception("Unhandled exception during peer refresh")
 
+            self._wake.wait(self._check_frequency)
+            self._wake.clear()
+
+    def wake(self):
+        """Runs the next topology check without waiting for the check
+        frequency to elapse.
+        """
+        self._wake.set()
+
     def stop(self):
         self._stopped = True
+        self._wake.set()
+        self._peers_response.set()
         with self._lock:
             for connection_id in self._connection_statuses:
                 try:
@@ -634,13 +843,12 @@ class ConnectionManager(InstrumentedThread):
     def retry_dynamic_peering(self):
         with self._lock:
             with self._gossip._lock:
-                self._refresh_peer_list()
+                self._gc_connections()
                 peers = self._gossip._peers.copy()
 
             peer_count = len(peers)
 
             self._reset_candidate_peer_endpoints()
-            self._refresh_connection_states()
             self._check_temp_connections()
 
         if peer_count < self._min_peers:
@@ -651,18 +859,21 @@ class ConnectionManager(InstrumentedThread):
                 peer_count,
                 self._min_peers)
 
+            with self._lock:
+                self._pending_peers_requests = set()
+            self._peers_response.clear()
             self._get_peers_of_peers(peers)
             self._get_peers_of_endpoints()
 
             # Wait for GOSSIP_GET_PEER_RESPONSE messages to arrive
-            time.sleep(self._response_duration)
+            self._wait_for_peers_responses()
 
             peers = self._gossip.get_peers()
             peered_endpoints = list(peers.values())
 
             with self._lock:
                 unpeered_candidates = list(
-                    set(self._candidate_peer_endpoints)
+                    self._candidate_peer_endpoints.keys()
                     - set(peered_endpoints)
                     - set([self._endpoint]))
 
@@ -676,54 +887,50 @@ class ConnectionManager(InstrumentedThread):
                 self._attempt_to_peer_with_endpoint(
                     random.choice(unpeered_candidates))
 
-    CandidatesAndRevPeers = Tuple['set[str]', 'dict[str,str]']
+    CandidatesAndPeered = Tuple['set[str]', 'set[str]']
 
-    def _endpoints_not_peered(self, initial_endpoints) -> CandidatesAndRevPeers:
+    def _endpoints_not_peered(self, initial_endpoints) -> CandidatesAndPeered:
         """
         Creates a set of the initial endpoints that are not yet peered and
-        an inverse map[endpoint_uri:connection_id] of the 'peers structure' dictionary.
+        a set of the endpoints that are peered.
         Note: needs Gossip's lock
 
         Args:
-            peers (dict): connection_id:endpoint uri
-            endpoints (list): endpoint uri
+            initial_endpoints (list): endpoint uri
 
         Returns:
-            CandidatesAndRevPeers: Tuple(
-                Set[endpoipnts],Dict[endpoints:connection_id])
+            CandidatesAndPeered: Tuple(Set[endpoints], Set[endpoints])
         """
-        peers_rev_map = {v: k for k, v in self._gossip._peers.items()}
+        peered_endpoints = set(self._gossip._peers_by_endpoint)
         candidates = set(initial_endpoints) - \
-            set([self._endpoint]) - set(peers_rev_map.keys())
-        return (candidates, peers_rev_map)
+            set([self._endpoint]) - peered_endpoints
+        return (candidates, peered_endpoints)
 
     def retry_static_peering(self):
         # Endpoints that have reached their retry count and should be
         # removed
         to_remove = []
         with self._lock:
-            self._refresh_connection_states()
             with self._gossip._lock:
-                self._refresh_peer_list()
-                candidates, peers_rev_map = self._endpoints_not_peered(
+                self._gc_connections()
+                candidates, peered_endpoints = self._endpoints_not_peered(
                     self._initial_peer_endpoints)
 
         # refresh status for connected static peers
-        static_endpoints_not_peered = set(peers_rev_map.keys()).intersection(
-            set(self._initial_peer_endpoints))
+        static_endpoints_not_peered = peered_endpoints.intersection(
+            self._initial_peer_endpoints)
         for endpoint in static_endpoints_not_peered:
-            self._static_peer_status[endpoint] = \
-                StaticPeerInfo(
-                    self._static_peer_status[endpoint].connection_id,
-                    time=0,
-                    retry_threshold=INITIAL_RETRY_FREQUENCY/2,
-                    count=0)
+            static_peer_info = self._static_peer_status[endpoint]
+            static_peer_info.time = 0
+            static_peer_info.retry_threshold = INITIAL_RETRY_FREQUENCY/2
+            static_peer_info.count = 0
 
+        now = time.time()
         for endpoint in candidates:
             static_peer_info = self._static_peer_status[endpoint]
             connection_id = static_peer_info.connection_id
 
-            if (time.time() - static_peer_info.time) > \
+            if (now - static_peer_info.time) > \
                     static_peer_info.retry_threshold:
                 # the first pass has the elapsed time wrong
                 if static_peer_info.time != 0:
@@ -733,31 +940,22 @@ class ConnectionManager(InstrumentedThread):
                                  connection_id,
                                  static_peer_info.retry_threshold)
 
+                new_count = static_peer_info.count
                 if static_peer_info.retry_threshold == \
                         MAXIMUM_STATIC_RETRY_FREQUENCY:
-                    if static_peer_info.count >= MAXIMUM_STATIC_RETRIES:
+                    if new_count >= MAXIMUM_STATIC_RETRIES:
                         # Unable to peer with endpoint
                         to_remove.append(endpoint)
                         continue
-                    else:
-                        # At maximum retry threashold, increment count
-                        self._static_peer_status[endpoint] = \
-                            StaticPeerInfo(
-                                connection_id,
-                                time=time.time(),
-                                retry_threshold=min(
-                                    static_peer_info.retry_threshold * 2,
-                                    MAXIMUM_STATIC_RETRY_FREQUENCY),
-                                count=static_peer_info.count + 1)
-                else:
-                    self._static_peer_status[endpoint] = \
-                        StaticPeerInfo(
-                            connection_id,
-                            time=time.time(),
-                            retry_threshold=min(
-                                static_peer_info.retry_threshold * 2,
-                                MAXIMUM_STATIC_RETRY_FREQUENCY),
-                            count=static_peer_info.count)
+                    # At maximum retry threashold, increment count
+                    new_count += 1
+                new_threshold = _next_backoff(
+                    static_peer_info.retry_threshold,
+                    MAXIMUM_STATIC_RETRY_FREQUENCY)
+
+                static_peer_info.time = now
+                static_peer_info.retry_threshold = new_threshold
+                static_peer_info.count = new_count
 
                 if connection_id:
                     complete = self._network.is_connection_handshake_complete(
@@ -773,16 +971,11 @@ class ConnectionManager(InstrumentedThread):
                     LOGGER.debug("attempting to peer with %s", endpoint)
                     new_conn = self._network.add_outbound_connection(
                         endpoint).connection_id
-                    old_info = self._static_peer_status[endpoint]
-                    self._static_peer_status[endpoint] = StaticPeerInfo(
-                        connection_id=new_conn,
-                        time=old_info.time,
-                        retry_threshold=old_info.retry_threshold,
-                        count=old_info.count)
+                    static_peer_info.connection_id = new_conn
                     self._temp_connections[new_conn] = EndpointInfo(
                         endpoint,
                         ConnectionStatus.PEERING,
-                        time.time(),
+                        now,
                         INITIAL_RETRY_FREQUENCY)
 
         for endpoint in to_remove:
@@ -791,18 +984,40 @@ class ConnectionManager(InstrumentedThread):
             self._initial_peer_endpoints.remove(endpoint)
             del self._static_peer_status[endpoint]
 
-    def add_candidate_peer_endpoints(self, peer_endpoints):
+    def add_candidate_peer_endpoints(self, peer_endpoints,
+                                     connection_id=None):
         """Adds candidate endpoints to the list of endpoints to
         attempt to peer with.
 
         Args:
             peer_endpoints ([str]): A list of public uri's which the
                 validator can attempt to peer with.
+            connection_id (str): The connection that answered with the
+                endpoints, if they came in a GOSSIP_GET_PEERS_RESPONSE.
         """
         with self._lock:
             for endpoint in peer_endpoints:
-                if endpoint not in self._candidate_peer_endpoints:
-                    self._candidate_peer_endpoints.append(endpoint)
+                self._candidate_peer_endpoints.setdefault(endpoint, None)
+            if connection_id in self._pending_peers_requests:
+                self._answer_pending_peers_request(connection_id)
+
+    def _answer_pending_peers_request(self, connection_id):
+        """Stops waiting for an answer from connection_id, ending the wait
+        of the topology search once nothing is pending.
+        Needs sync
+        """
+        self._pending_peers_requests.discard(connection_id)
+        if not self._pending_peers_requests:
+            self._peers_response.set()
+
+    def _wait_for_peers_responses(self):
+        """Waits until every pending GOSSIP_GET_PEERS_REQUEST is answered,
+        the response duration elapses or the manager stops.
+        """
+        with self._lock:
+            if not self._pending_peers_requests or self._stopped:
+                return
+        self._peers_response.wait(self._response_duration)
 
     def set_connection_status(self, connection_id, status):
         """ Needs sync
@@ -815,7 +1030,16 @@ class ConnectionManager(InstrumentedThread):
 
     def get_connection_statuses(self):
         with self._lock:
-            return copy.copy(self._connection_statuses)
+            return self._connection_statuses.copy()
+
+    def get_peer_status_ids(self):
+        """Returns the connection ids whose status is PEER."""
+        with self._lock:
+            return frozenset(
+                connection_id
+                for connection_id, status
+                in self._connection_statuses.items()
+                if status == PeerStatus.PEER)
 
     def _remove_connection_status(self, connection_id):
         """ Needs sync
@@ -827,19 +1051,6 @@ class ConnectionManager(InstrumentedThread):
         with self._lock:
             self._remove_connection_status(connection_id)
 
-    def _clean_temp_connection_info(self) -> None:
-        """Remove any temporal connection info that may have lost its connection but was not deleted.
-            Needs sync.
-            May not be needed if connection info is cleaned elsewhere.
-            Same idea behind _refresh_peer_list, there is no event to inform the connection manager that a connection is gone, relies on the CM doing checks.
-        """
-        to_remove = [
-            conn for conn in self._temp_connections if not self._network._has_connection(conn)]
-        for conn in to_remove:
-            LOGGER.debug(
-                "Removing connection info without connection {}".format(conn[:8]))
-            self._remove_temp_connection_info(conn)
-
     def _remove_temp_connection_info(self, connection):
         """ Needs sync
         """
@@ -850,22 +1061,27 @@ class ConnectionManager(InstrumentedThread):
         """For any temp_connection not authorized, remove it and add a new connection.
         Note: Needs sync.
         """
-        # create dict filtered by time and handshake
-        retry_connections = {conn: conn_info for conn, conn_info in self._temp_connections.items() if time.time(
-        ) - conn_info.time > conn_info.retry_threshold and not self._network.is_connection_handshake_complete(conn)}
-
-        for connection, connection_info in retry_connections.items():
+        now = time.time()
+        complete = self._network.get_handshake_complete_connection_ids()
+        # collect the connections filtered by time and handshake
+        stale = []
+        for conn, conn_info in self._temp_connections.items():
+            if now - conn_info.time > conn_info.retry_threshold and \
+                    conn not in complete:
+                stale.append((conn, conn_info))
+
+        for connection, connection_info in stale:
             endpoint = connection_info.endpoint
 
             LOGGER.debug("Endpoint has not completed authorization in "
                          "%s seconds: %s, Status: %s",
-                         time.time() - connection_info.time,
+                         now - connection_info.time,
                          endpoint,
                          connection_info.status)
 
             new_threshold = connection_info.retry_threshold if connection_info.retry_threshold != MAXIMUM_RETRY_FREQUENCY else INITIAL_RETRY_FREQUENCY / 2
-            new_threshold = min(new_threshold * 2,
-                                MAXIMUM_RETRY_FREQUENCY)
+            new_threshold = _next_backoff(new_threshold,
+                                          MAXIMUM_RETRY_FREQUENCY)
             status = connection_info.status
             self._remove_temp_connection_info(connection)
             self._network.remove_connection(connection)
@@ -875,17 +1091,25 @@ class ConnectionManager(InstrumentedThread):
             self._temp_connections[new_conn] = EndpointInfo(
                 endpoint,
                 status,
-                time.time(),
-                new_threshold)
-
-    def _refresh_peer_list(self):
-        """Remove any peer without a connection and its connection status.
+                now,
+                new_threshold,
+                retries=connection_info.retries + 1)
+
+    def _gc_connections(self):
+        """Remove any peer, connection status or temporary connection info
+        whose connection went away. There is no event to inform the
+        connection manager that a connection is gone, so this relies on the
+        CM doing checks. Every map is checked against one snapshot of the
+        network's connection ids, and peers against one snapshot of the
+        connections that completed their handshake.
             Note: Needs sync, CManager and Gossip locks
         """
+        live = self._network.get_connection_ids()
+        complete = self._network.get_handshake_complete_connection_ids()
 
-        peers = copy.copy(self._gossip._peers)
+        peers = self._gossip._peers.copy()
         for conn_id, endpoint in peers.items():
-            if not self._network.is_connection_handshake_complete(conn_id):
+            if conn_id not in complete:
                 LOGGER.debug("removing peer %s because "
                              "connection went away",
                              endpoint)
@@ -893,51 +1117,78 @@ class ConnectionManager(InstrumentedThread):
                 self._gossip._unregister_peer(conn_id)
                 self._remove_connection_status(conn_id)
 
-    def _refresh_connection_states(self):
-        """Cleans out any old connections that have disconnected.
-            Remove any connection_status without a connection.
-            Note: needs sync.
-        """
+        # Dicts do not shrink as entries are deleted, so a map losing many
+        # of its entries is rebuilt instead to release the table
         closed_connections = [
-            conn for conn in self._connection_statuses if not self._network.has_connection(conn)]
-        for connection_id in closed_connections:
-            del self._connection_statuses[connection_id]
+            conn for conn in self._connection_statuses if conn not in live]
+        if len(closed_connections) > len(self._connection_statuses) // 4:
+            self._connection_statuses = {
+                conn: status
+                for conn, status in self._connection_statuses.items()
+                if conn in live}
+        else:
+            for connection_id in closed_connections:
+                del self._connection_statuses[connection_id]
+
+        lost_connections = [
+            conn for conn in self._temp_connections if conn not in live]
+        if LOGGER.isEnabledFor(logging.DEBUG):
+            for conn in lost_connections:
+                LOGGER.debug(
+                    "Removing connection info without connection %s",
+                    conn[:8])
+        if len(lost_connections) > len(self._temp_connections) // 4:
+            self._temp_connections = {
+                conn: info
+                for conn, info in self._temp_connections.items()
+                if conn in live}
+        else:
+            for conn in lost_connections:
+                self._remove_temp_connection_info(conn)
 
     def _get_peers_of_peers(self, peers: dict):
         """Send get_peers request to peers.
             If it fails, skips.
         """
-        get_peers_request = GetPeersRequest()
+        send = self._network.send
+        message_type = validator_pb2.Message.GOSSIP_GET_PEERS_REQUEST
+        payload = self._get_peers_request_bytes
+
+        # Pending before sending, so that a quick answer is not missed
+        with self._lock:
+            self._pending_peers_requests.update(peers)
 
         for conn_id in peers:
             try:
-                self._network.send(
-                    validator_pb2.Message.GOSSIP_GET_PEERS_REQUEST,
-                    get_peers_request.SerializeToString(),
-                    conn_id)
+                send(message_type, payload, conn_id)
             except ValueError:
                 LOGGER.debug("Peer disconnected: %s", conn_id)
+                with self._lock:
+                    self._answer_pending_peers_request(conn_id)
 
     def _get_peers_of_endpoints(self):
         """Send a get peers request to the initial peers(seeds) by creating an outbound connection if it doesn't exist.
             Skips peered connections as another function is supposed to send those get peer requests.
             Skips connections pending authorization.
         """
-        with self._lock:
-            with self._gossip._lock:
-                endpoints, peers_rev = self._endpoints_not_peered(
-                    self._initial_seed_endpoints)
-        peered_endpoints = peers_rev.keys()
+        # The seeds are immutable and get_peers returns a lock-free
+        # snapshot, so neither lock is needed to pick the endpoints
+        peered_endpoints = set(self._gossip.get_peers().values())
+        endpoints = set(self._initial_seed_endpoints) - \
+            set([self._endpoint]) - peered_endpoints
         for endpoint in endpoints:
-            if endpoint in peered_endpoints:
-                continue
-
             try:
                 _ = self._network.get_connection_id_by_endpoint(endpoint)
 
             except KeyError:
                 # If the connection does not exist, send a connection request
                 with self._lock:
+                    if self._pending_handshakes_saturated():
+                        LOGGER.debug(
+                            "Too many pending handshakes, deferring "
+                            "connection to seed %s",
+                            endpoint)
+                        break
                     # if the connection is lost during the handshake this function is not responsible for cleaning the temporal_connection_info
                     new_conn = self._network.add_outbound_connection(
                         endpoint).connection_id
@@ -946,6 +1197,8 @@ class ConnectionManager(InstrumentedThread):
                         ConnectionStatus.TOPOLOGY,
                         time.time(),
                         INITIAL_RETRY_FREQUENCY)
+                    # connect_success sends its GOSSIP_GET_PEERS_REQUEST
+                    self._pending_peers_requests.add(new_conn)
 
             # A not-peered connection with a complete handshake is a temporal connection.
             # There is no point in sending a GOSSIP_GET_PEERS_REQUEST because:
@@ -966,8 +1219,14 @@ class ConnectionManager(InstrumentedThread):
         try:
             conn_id = self._network.get_connection_id_by_endpoint(endpoint)
         except KeyError:
-            LOGGER.debug("Attempting to connect/peer with %s", endpoint)
             with self._lock:
+                if self._pending_handshakes_saturated():
+                    LOGGER.debug(
+                        "Too many pending handshakes, deferring "
+                        "connection to %s",
+                        endpoint)
+                    return
+                LOGGER.debug("Attempting to connect/peer with %s", endpoint)
                 new_conn = self._network.add_outbound_connection(
                     endpoint).connection_id
                 self._temp_connections[new_conn] = EndpointInfo(
@@ -976,9 +1235,21 @@ class ConnectionManager(InstrumentedThread):
             LOGGER.debug(
                 "endpoint %s has %s an outstanding connection", endpoint, conn_id)
 
+    def _pending_handshakes_saturated(self):
+        """Needs sync"""
+        now = time.time()
+        pending = 0
+        for endpoint_info in self._temp_connections.values():
+            if endpoint_info.retries == 0 and \
+                    now - endpoint_info.time <= endpoint_info.retry_threshold:
+                pending += 1
+                if pending >= MAXIMUM_PENDING_HANDSHAKES:
+                    return True
+        return False
+
     def _reset_candidate_peer_endpoints(self):
         """Needs sync"""
-        self._candidate_peer_endpoints = []
+        self._candidate_peer_endpoints = {}
 
     def _peer_callback(self, request, result, connection_id, endpoint=None):
         ack = NetworkAcknowledgement()
@@ -989,8 +1260,8 @@ class ConnectionManager(InstrumentedThread):
                              connection_id, endpoint)
                 self._remove_temporary_connection(connection_id)
             elif ack.status == ack.OK:
-                LOGGER.debug("Peering request to {} ({}) was successful".format(
-                    connection_id, endpoint))
+                LOGGER.debug("Peering request to %s (%s) was successful",
+                             connection_id, endpoint)
                 if endpoint:
                     try:
                         self._gossip._register_peer(connection_id, endpoint)
@@ -1068,6 +1339,9 @@ class ConnectionManager(InstrumentedThread):
 
             self._remove_temp_connection_info(connection_id)
 
+        # Act on the new connection without waiting for the check frequency
+        self._wake.set()
+
     def _connect_success_peering(self, connection_id, endpoint):
         """Needs sync"""
         LOGGER.debug("Connection to %s succeeded", connection_id)
@@ -1093,7 +1367,6 @@ class ConnectionManager(InstrumentedThread):
         LOGGER.debug("Connection to %s succeeded for topology request",
                      connection_id)
         self.set_connection_status(connection_id, PeerStatus.TEMP)
-        get_peers_request = GetPeersRequest()
 
         def callback(request, result):
             '''
@@ -1104,7 +1377,7 @@ class ConnectionManager(InstrumentedThread):
         try:
             self._network.send(
                 validator_pb2.Message.GOSSIP_GET_PEERS_REQUEST,
-                get_peers_request.SerializeToString(),
+                self._get_peers_request_bytes,
                 connection_id,
                 callback=callback)
         except ValueError:
@@ -73,7 +73,8 @@ class GetPeersResponseHandler(Handler):
             connection_id,
             response.peer_endpoints)
 
-        self._gossip.add_candidate_peer_endpoints(response.peer_endpoints)
+        self._gossip.add_candidate_peer_endpoints(
+            response.peer_endpoints, connection_id=connection_id)
         connection_manager = self._gossip._topology
         if connection_manager:
             status = connection_manager.get_connection_status(connection_id)
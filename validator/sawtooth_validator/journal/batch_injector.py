@@ -16,13 +16,12 @@
 import abc
 import hashlib
 import importlib
-import uuid
+import os
 
 from sawtooth_validator.state.settings_view import SettingsView
 
 from sawtooth_validator.protobuf.batch_pb2 import Batch
 from sawtooth_validator.protobuf.batch_pb2 import BatchHeader
-from sawtooth_validator.protobuf.transaction_pb2 import Transaction
 from sawtooth_validator.protobuf.transaction_pb2 import TransactionHeader
 
 
@@ -81,6 +80,8 @@ class DefaultBatchInjectorFactory:
         """
         self._state_view_factory = state_view_factory
         self._signer = signer
+        # Stateless and asked for once per block, so built only once
+        self._gluwa_injector = GluwaBatchInjector(signer)
 
     def _read_injector_setting(self, state_root_hash):
         state_view = self._state_view_factory.create_view(state_root_hash)
@@ -93,7 +94,7 @@ class DefaultBatchInjectorFactory:
     def create_injectors(self, state_root_hash):
         #injectors = self._read_injector_setting(state_root_hash)
         # return [self._create_injector(i) for i in injectors]
-        return [GluwaBatchInjector(self._signer)]
+        return [self._gluwa_injector]
 
     def _create_injector(self, injector):
         """Returns a new batch injector"""
@@ -107,47 +108,54 @@ class DefaultBatchInjectorFactory:
         raise UnknownBatchInjectorError(injector)
 
 
+GLUWA_FAMILY_NAME = 'CREDITCOIN'
+GLUWA_FAMILY_VERSION = '1.8'
+GLUWA_NAMESPACE = '8a1a04'
+
+
 class GluwaBatchInjector(BatchInjector):
     housekeeping_payload = b'\xa2avlHousekeepingbp1a0'
+    housekeeping_payload_sha512 = \
+        hashlib.sha512(housekeeping_payload).hexdigest()
 
     def __init__(self, signer):
         self._signer = signer
+        self._sign = signer.sign
+        self._pub_key = signer.get_public_key().as_hex()
 
     def block_start(self, previous_block):
-        pub_key = self._signer.get_public_key().as_hex()
-        version = '1.8'
-        ns = '8a1a04'
+        pub_key = self._pub_key
+        sign = self._sign
         payload = GluwaBatchInjector.housekeeping_payload
         tx_header = TransactionHeader(
-            family_name='CREDITCOIN',
-            family_version=version,
-            inputs=[ns],
-            outputs=[ns],
-            nonce=str(uuid.uuid4()),
+            family_name=GLUWA_FAMILY_NAME,
+            family_version=GLUWA_FAMILY_VERSION,
+            inputs=[GLUWA_NAMESPACE],
+            outputs=[GLUWA_NAMESPACE],
+            nonce=os.urandom(16).hex(),
             batcher_public_key=pub_key,
             dependencies=[],
             signer_public_key=pub_key,
-            payload_sha512=hashlib.sha512(payload).hexdigest()
+            payload_sha512=GluwaBatchInjector.housekeeping_payload_sha512
         )
         tx_header_str = tx_header.SerializeToString()
-        tx_header_signature = self._signer.sign(tx_header_str)
-        tx = Transaction(
-            payload=payload,
-            header=tx_header_str,
-            header_signature=tx_header_signature
-        )
-        txn_signatures = [tx.header_signature]
+        tx_header_signature = sign(tx_header_str)
         batch_header = BatchHeader(
             signer_public_key=pub_key,
-            transaction_ids=txn_signatures
+            transaction_ids=[tx_header_signature]
         )
         batch_header_str = batch_header.SerializeToString()
-        batch_header_signature = self._signer.sign(batch_header_str)
+        batch_header_signature = sign(batch_header_str)
         batch = Batch(
             header=batch_header_str,
-            transactions=[tx],
             header_signature=batch_header_signature
         )
+        # Built in place, passing a Transaction would copy it into the batch
+        batch.transactions.add(
+            payload=payload,
+            header=tx_header_str,
+            header_signature=tx_header_signature
+        )
         return [batch]
 
     def version():
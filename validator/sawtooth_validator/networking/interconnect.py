@@ -93,6 +93,12 @@ def get_enum_name(enum_value):
 
 _STARTUP_COMPLETE_SENTINEL = 1
 
+# Messages queued per peer before zmq blocks or drops; raised from the
+# zmq default of 1000 so gossip bursts don't stall the sender.
+_SEND_HIGH_WATER_MARK = 10000
+# Kernel send buffer size in bytes for each socket.
+_SEND_BUFFER_SIZE = 1024 * 1024
+
 
 class _SendReceive:
     def __init__(self, connection, address, futures, connections,
@@ -400,12 +406,22 @@ class _SendReceive:
 
     @asyncio.coroutine
     def _send_message_frame(self, message_frame):
-        yield from self._socket.send_multipart(message_frame)
+        # With copy=False pyzmq still copies frames below its copy
+        # threshold, and hands larger ones to zmq without a copy.
+        yield from self._socket.send_multipart(message_frame, copy=False)
 
-    def send_message(self, msg, connection_id=None):
-        """
-        :param msg: protobuf validator_pb2.Message
-        """
+    @asyncio.coroutine
+    def _send_message_frames(self, message_frames):
+        for message_frame in message_frames:
+            # A failed send must not cost the remaining peers their copy
+            try:
+                yield from self._socket.send_multipart(
+                    message_frame, copy=False)
+            except zmq.error.ZMQError as e:
+                LOGGER.warning("Unable to send a message on address %s: %s",
+                               self._address, e)
+
+    def _get_zmq_identity(self, connection_id):
         zmq_identity = None
         if connection_id is not None and self._connections is not None:
             if connection_id in self._connections:
@@ -416,14 +432,23 @@ class _SendReceive:
             else:
                 LOGGER.debug("Can't send to %s, not in self._connections",
                              connection_id)
+        return zmq_identity
+
+    @staticmethod
+    def _message_bundle(zmq_identity, msg):
+        if zmq_identity is None:
+            return [msg.SerializeToString()]
+        return [bytes(zmq_identity), msg.SerializeToString()]
+
+    def send_message(self, msg, connection_id=None):
+        """
+        :param msg: protobuf validator_pb2.Message
+        """
+        zmq_identity = self._get_zmq_identity(connection_id)
 
         self._ready.wait()
 
-        if zmq_identity is None:
-            message_bundle = [msg.SerializeToString()]
-        else:
-            message_bundle = [bytes(zmq_identity),
-                              msg.SerializeToString()]
+        message_bundle = self._message_bundle(zmq_identity, msg)
 
         try:
             asyncio.run_coroutine_threadsafe(
@@ -434,6 +459,27 @@ class _SendReceive:
             # the eventloop is closed. This occurs on shutdown.
             pass
 
+    def send_messages(self, msgs):
+        """
+        Sends several messages with a single hand-off to the event loop.
+
+        :param msgs: list of (protobuf validator_pb2.Message, connection_id)
+        """
+        message_bundles = [
+            self._message_bundle(self._get_zmq_identity(connection_id), msg)
+            for msg, connection_id in msgs]
+
+        self._ready.wait()
+
+        try:
+            asyncio.run_coroutine_threadsafe(
+                self._send_message_frames(message_bundles),
+                self._event_loop)
+        except RuntimeError:
+            # run_coroutine_threadsafe will throw a RuntimeError if
+            # the eventloop is closed. This occurs on shutdown.
+            pass
+
     @asyncio.coroutine
     def _send_last_message(self, identity, msg):
         LOGGER.debug("%s sending last message %s to %s",
@@ -553,6 +599,8 @@ class _SendReceive:
             self._socket.set(zmq.TCP_KEEPALIVE, 1)
             self._socket.set(zmq.TCP_KEEPALIVE_IDLE, self._connection_timeout)
             self._socket.set(zmq.TCP_KEEPALIVE_INTVL, self._heartbeat_interval)
+            self._socket.set(zmq.SNDHWM, _SEND_HIGH_WATER_MARK)
+            self._socket.set(zmq.SNDBUF, _SEND_BUFFER_SIZE)
 
             # Enable IPv6 if necessary
             if self._need_enable_ipv6(socket_type):
@@ -862,6 +910,31 @@ class Interconnect:
             except KeyError:
                 return None
 
+    def get_connection_ids(self):
+        """
+        Get a snapshot of the ids of every known connection.
+
+        Returns:
+            frozenset - the connection ids
+        """
+        with self._connections_lock:
+            return frozenset(self._connections)
+
+    def get_handshake_complete_connection_ids(self):
+        """
+        Get a snapshot of the ids of the connections that have completed
+        the authorization handshake.
+
+        Returns:
+            frozenset - the connection ids
+        """
+        with self._connections_lock:
+            return frozenset(
+                connection_id
+                for connection_id, connection_info
+                in self._connections.items()
+                if connection_info.status == ConnectionStatus.CONNECTED)
+
     def is_connection_handshake_complete(self, connection_id):
         """
         Indicates whether or not a connection has completed the authorization
@@ -1134,6 +1207,50 @@ class Interconnect:
             callback=callback,
             one_way=one_way)
 
+    def send_many(self, message_type, data, connection_ids, one_way=True):
+        """
+        Send the same message of message_type to several connections
+        :param message_type: validator_pb2.Message.* enum value
+        :param data: bytes serialized protobuf
+        :param connection_ids: the identities for the connections to send to
+        :return: list of the connection ids that are no longer valid
+        """
+        failed = []
+        messages = []
+        for connection_id in connection_ids:
+            connection_info = self._connections.get(connection_id)
+            if connection_info is None:
+                failed.append(connection_id)
+            elif connection_info.connection_type == \
+                    ConnectionType.ZMQ_IDENTITY:
+                message = validator_pb2.Message(
+                    correlation_id=_generate_id(),
+                    content=data,
+                    message_type=message_type)
+                if not one_way:
+                    timer_tag = get_enum_name(message.message_type)
+                    timer_ctx = self._get_send_response_timer(
+                        timer_tag).time()
+                    self._futures.put(future.Future(
+                        message.correlation_id,
+                        message.content,
+                        None,
+                        timeout=self._connection_timeout,
+                        timer_ctx=timer_ctx))
+                messages.append((message, connection_id))
+            else:
+                # Outbound connections each own their socket
+                connection_info.connection.send(
+                    message_type,
+                    data,
+                    one_way=one_way)
+
+        # All inbound connections share the server socket, so their
+        # frames are handed to its event loop in one go.
+        if messages:
+            self._send_receive_thread.send_messages(messages)
+        return failed
+
     def start(self):
         complete_or_error_queue = queue.Queue()
         self._thread = InstrumentedThread(
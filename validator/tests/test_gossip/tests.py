@@ -0,0 +1,493 @@
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+# pylint: disable=protected-access
+
+import itertools
+import os
+import threading
+import time
+import unittest
+from unittest.mock import Mock
+from unittest.mock import patch
+
+from sawtooth_validator.gossip import gossip
+from sawtooth_validator.gossip.gossip import ConnectionManager
+from sawtooth_validator.gossip.gossip import ConnectionStatus
+from sawtooth_validator.gossip.gossip import EndpointInfo
+from sawtooth_validator.gossip.gossip import Gossip
+from sawtooth_validator.gossip.gossip import PeerStatus
+from sawtooth_validator.protobuf import validator_pb2
+
+
+def _peer_endpoint(connection_id):
+    return "tcp://{}:8800".format(connection_id)
+
+
+class _GossipTestCase(unittest.TestCase):
+    """Builds a Gossip and its ConnectionManager over a mocked network,
+    neither of them started.
+    """
+
+    def setUp(self):
+        self.mock_network = Mock()
+        self.mock_network.connection_id_to_public_key.return_value = None
+        self.mock_network.send_many.return_value = []
+
+        self.gossip = Gossip(
+            self.mock_network,
+            settings_cache=Mock(),
+            current_chain_head_func=Mock(),
+            current_root_func=Mock(),
+            consensus_notifier=Mock(),
+            endpoint="tcp://self:8800")
+        self.topology = ConnectionManager(
+            self.gossip,
+            self.mock_network,
+            endpoint="tcp://self:8800",
+            current_chain_head_func=Mock(),
+            initial_peer_endpoints=[],
+            initial_seed_endpoints=[],
+            peering_mode='static')
+        self.gossip._topology = self.topology
+
+    def _register_peers(self, *connection_ids):
+        with self.topology._lock:
+            for connection_id in connection_ids:
+                self.gossip._register_peer(
+                    connection_id, _peer_endpoint(connection_id))
+
+
+class TestGossipBroadcast(_GossipTestCase):
+
+    def test_broadcast_drops_unknown_peers(self):
+        """Tests that broadcast_bytes hands every peer to send_many in
+        one call and unregisters the ones the network reports unknown.
+        """
+        self._register_peers("conn1", "conn2", "conn3")
+        self.mock_network.send_many.return_value = ["conn2"]
+
+        self.gossip.broadcast_bytes(
+            b"message", validator_pb2.Message.GOSSIP_MESSAGE)
+
+        self.assertEqual(self.mock_network.send_many.call_count, 1)
+        message_type, data, connection_ids = \
+            self.mock_network.send_many.call_args[0]
+        self.assertEqual(message_type, validator_pb2.Message.GOSSIP_MESSAGE)
+        self.assertEqual(data, b"message")
+        self.assertEqual(set(connection_ids), {"conn1", "conn2", "conn3"})
+
+        self.assertEqual(
+            self.gossip.get_peers(),
+            {"conn1": _peer_endpoint("conn1"),
+             "conn3": _peer_endpoint("conn3")})
+        self.assertNotIn(
+            _peer_endpoint("conn2"), self.gossip._peers_by_endpoint)
+
+    def test_broadcast_exclude(self):
+        """Tests that excluded connections are not handed to send_many.
+        """
+        self._register_peers("conn1", "conn2", "conn3")
+
+        self.gossip.broadcast_bytes(
+            b"message",
+            validator_pb2.Message.GOSSIP_MESSAGE,
+            exclude=["conn2"])
+
+        connection_ids = self.mock_network.send_many.call_args[0][2]
+        self.assertEqual(set(connection_ids), {"conn1", "conn3"})
+        self.assertEqual(len(self.gossip.get_peers()), 3)
+
+
+class TestGossipPeers(_GossipTestCase):
+
+    def test_reregister_with_new_endpoint(self):
+        """Tests that a connection registering again under a new endpoint
+        does not leave its old endpoint blocked.
+        """
+        self._register_peers("conn1")
+        with self.topology._lock:
+            self.gossip._register_peer("conn1", _peer_endpoint("moved"))
+
+        self.assertEqual(
+            self.gossip._peers_by_endpoint,
+            {_peer_endpoint("moved"): "conn1"})
+
+        # The endpoint conn1 moved away from is free for a new peer
+        with self.topology._lock:
+            self.gossip._register_peer("conn2", _peer_endpoint("conn1"))
+        self.assertEqual(
+            self.gossip.get_peers(),
+            {"conn1": _peer_endpoint("moved"),
+             "conn2": _peer_endpoint("conn1")})
+
+
+class TestConnectionManagerGc(_GossipTestCase):
+
+    def _add_temp_connections(self, *connection_ids):
+        for connection_id in connection_ids:
+            self.topology._temp_connections[connection_id] = EndpointInfo(
+                _peer_endpoint(connection_id),
+                ConnectionStatus.PEERING,
+                0,
+                gossip.INITIAL_RETRY_FREQUENCY)
+
+    def _add_connection_statuses(self, *connection_ids):
+        for connection_id in connection_ids:
+            self.topology._connection_statuses[connection_id] = \
+                PeerStatus.TEMP
+
+    def _gc_connections(self, live, complete):
+        self.mock_network.get_connection_ids.return_value = \
+            frozenset(live)
+        self.mock_network.get_handshake_complete_connection_ids\
+            .return_value = frozenset(complete)
+        with self.topology._lock:
+            with self.gossip._lock:
+                self.topology._gc_connections()
+
+    def test_gc_connections_prunes_all_maps(self):
+        """Tests that peers, connection statuses and temporary connection
+        info without a connection are removed.
+        """
+        self._register_peers("peer1", "peer2")
+        self._add_temp_connections("temp1", "temp2")
+        self._add_connection_statuses("other1", "other2")
+
+        # peer2 is connected but its handshake is no longer complete
+        self._gc_connections(
+            live=["peer1", "peer2", "temp1", "other1"],
+            complete=["peer1"])
+
+        self.assertEqual(
+            self.gossip.get_peers(), {"peer1": _peer_endpoint("peer1")})
+        self.assertEqual(
+            set(self.topology._connection_statuses), {"peer1", "other1"})
+        self.assertEqual(set(self.topology._temp_connections), {"temp1"})
+
+    def test_gc_connections_deletes_few_in_place(self):
+        """Tests that a map losing at most a quarter of its entries is
+        deleted from in place.
+        """
+        self._add_temp_connections("temp1", "temp2", "temp3", "temp4")
+        self._add_connection_statuses("temp1", "temp2", "temp3", "temp4")
+        statuses = self.topology._connection_statuses
+        temp_connections = self.topology._temp_connections
+
+        self._gc_connections(
+            live=["temp1", "temp2", "temp3"], complete=[])
+
+        self.assertEqual(
+            set(self.topology._connection_statuses),
+            {"temp1", "temp2", "temp3"})
+        self.assertEqual(
+            set(self.topology._temp_connections),
+            {"temp1", "temp2", "temp3"})
+        self.assertIs(self.topology._connection_statuses, statuses)
+        self.assertIs(self.topology._temp_connections, temp_connections)
+
+    def test_gc_connections_rebuilds_mostly_stale_maps(self):
+        """Tests that a map losing more than a quarter of its entries is
+        rebuilt rather than deleted from.
+        """
+        self._add_temp_connections("temp1", "temp2", "temp3", "temp4")
+        self._add_connection_statuses("temp1", "temp2", "temp3", "temp4")
+        statuses = self.topology._connection_statuses
+        temp_connections = self.topology._temp_connections
+
+        self._gc_connections(live=["temp1"], complete=[])
+
+        self.assertEqual(
+            self.topology._connection_statuses, {"temp1": PeerStatus.TEMP})
+        self.assertEqual(list(self.topology._temp_connections), ["temp1"])
+        self.assertIsNot(self.topology._connection_statuses, statuses)
+        self.assertIsNot(self.topology._temp_connections, temp_connections)
+
+    def test_check_temp_connections_probes_once(self):
+        """Tests that expired temporary connections are retried unless
+        their handshake completed, with a single handshake snapshot.
+        """
+        self._add_temp_connections("temp1", "temp2")
+        self.mock_network.get_handshake_complete_connection_ids\
+            .return_value = frozenset(["temp2"])
+        self.mock_network.add_outbound_connection.return_value\
+            .connection_id = "retry1"
+
+        with self.topology._lock:
+            self.topology._check_temp_connections()
+
+        self.assertEqual(
+            self.mock_network.get_handshake_complete_connection_ids
+            .call_count, 1)
+        self.mock_network.is_connection_handshake_complete\
+            .assert_not_called()
+        self.mock_network.remove_connection.assert_called_once_with("temp1")
+        self.assertEqual(
+            set(self.topology._temp_connections), {"temp2", "retry1"})
+
+
+class TestPendingHandshakes(_GossipTestCase):
+
+    def setUp(self):
+        super().setUp()
+        connection_ids = itertools.count()
+        self.mock_network.get_connection_id_by_endpoint.side_effect = \
+            KeyError
+        self.mock_network.add_outbound_connection.side_effect = \
+            lambda endpoint: Mock(
+                connection_id="conn{}".format(next(connection_ids)))
+        self.mock_network.get_handshake_complete_connection_ids\
+            .return_value = frozenset()
+
+    def test_dead_candidates_do_not_block_peering(self):
+        """Tests that candidates which never complete their handshake
+        only hold back new connections during their first retry window.
+        """
+        dead = [_peer_endpoint("dead{}".format(i))
+                for i in range(gossip.MAXIMUM_PENDING_HANDSHAKES)]
+        live = _peer_endpoint("live")
+
+        for endpoint in dead:
+            self.topology._attempt_to_peer_with_endpoint(endpoint)
+        self.topology._attempt_to_peer_with_endpoint(live)
+
+        # The cap defers the live candidate while the attempts are fresh
+        self.assertEqual(
+            self.mock_network.add_outbound_connection.call_count,
+            gossip.MAXIMUM_PENDING_HANDSHAKES)
+
+        # Once the dead attempts expire they are retried, and retries do
+        # not count toward the cap
+        later = time.time() + gossip.INITIAL_RETRY_FREQUENCY + 1
+        with patch.object(gossip.time, 'time', return_value=later):
+            with self.topology._lock:
+                self.topology._check_temp_connections()
+            self.topology._attempt_to_peer_with_endpoint(live)
+
+        self.assertEqual(
+            len(self.topology._temp_connections),
+            gossip.MAXIMUM_PENDING_HANDSHAKES + 1)
+        self.mock_network.add_outbound_connection.assert_called_with(live)
+
+
+class TestPeersResponseWait(_GossipTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.topology._response_duration = 5
+
+    def _wait_for_peers_responses(self):
+        start = time.monotonic()
+        self.topology._wait_for_peers_responses()
+        return time.monotonic() - start
+
+    def _send_peers_requests(self, *connection_ids):
+        self.topology._peers_response.clear()
+        self.topology._get_peers_of_peers(
+            {connection_id: _peer_endpoint(connection_id)
+             for connection_id in connection_ids})
+
+    def test_wait_ends_when_all_answered(self):
+        """Tests that the wait ends as soon as every request is answered,
+        and not on the first answer.
+        """
+        self._send_peers_requests("conn1", "conn2")
+
+        self.topology.add_candidate_peer_endpoints(
+            [_peer_endpoint("a")], connection_id="conn1")
+        self.assertFalse(self.topology._peers_response.is_set())
+
+        self.topology.add_candidate_peer_endpoints(
+            [_peer_endpoint("b")], connection_id="conn2")
+        self.assertTrue(self.topology._peers_response.is_set())
+
+        self.assertLess(self._wait_for_peers_responses(), 1)
+        self.assertEqual(
+            list(self.topology._candidate_peer_endpoints),
+            [_peer_endpoint("a"), _peer_endpoint("b")])
+
+    def test_wait_times_out_on_missing_answer(self):
+        """Tests that an unanswered request holds the wait until the
+        response duration elapses.
+        """
+        self.topology._response_duration = 0.2
+        self._send_peers_requests("conn1", "conn2")
+
+        self.topology.add_candidate_peer_endpoints(
+            [_peer_endpoint("a")], connection_id="conn1")
+
+        self.assertGreaterEqual(self._wait_for_peers_responses(), 0.2)
+        self.assertFalse(self.topology._peers_response.is_set())
+
+    def test_unrequested_answer_is_not_counted(self):
+        """Tests that an answer from a connection that was not asked adds
+        its endpoints without ending the wait.
+        """
+        self._send_peers_requests("conn1")
+
+        self.topology.add_candidate_peer_endpoints(
+            [_peer_endpoint("a")], connection_id="other")
+
+        self.assertFalse(self.topology._peers_response.is_set())
+        self.assertIn(
+            _peer_endpoint("a"), self.topology._candidate_peer_endpoints)
+
+    def test_failed_send_is_not_awaited(self):
+        """Tests that a request that could not be sent is not waited on.
+        """
+        def send(message_type, data, connection_id):
+            if connection_id == "conn2":
+                raise ValueError()
+        self.mock_network.send.side_effect = send
+
+        self._send_peers_requests("conn1", "conn2")
+        self.assertEqual(self.topology._pending_peers_requests, {"conn1"})
+
+        self.topology.add_candidate_peer_endpoints([], connection_id="conn1")
+        self.assertLess(self._wait_for_peers_responses(), 1)
+
+    def test_nothing_requested_does_not_wait(self):
+        """Tests that no wait happens when no request is pending."""
+        self._send_peers_requests()
+
+        self.assertLess(self._wait_for_peers_responses(), 1)
+
+    def test_stop_ends_wait(self):
+        """Tests that stopping the manager ends a pending wait early."""
+        self._send_peers_requests("conn1")
+
+        timer = threading.Timer(0.1, self.topology.stop)
+        timer.start()
+        try:
+            self.assertLess(self._wait_for_peers_responses(), 1)
+        finally:
+            timer.join()
+
+
+class TestConsensusNotifier(_GossipTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.delivered = []
+        self.notify_thread = threading.Thread(target=self.gossip._notify_loop)
+
+    def _notify(self, public_key):
+        self.delivered.append(public_key)
+
+    def _stop_and_join(self):
+        self.gossip.stop()
+        self.notify_thread.join(5)
+        self.assertFalse(self.notify_thread.is_alive())
+
+    def test_notifications_are_delivered_in_order(self):
+        """Tests that notifications queued while the consensus notifier is
+        busy are delivered in the order they were queued.
+        """
+        release = threading.Event()
+
+        def blocking_notify(public_key):
+            release.wait(5)
+            self._notify(public_key)
+
+        self.gossip._notify_queue.put((blocking_notify, "key0"))
+        self.notify_thread.start()
+        for i in range(1, 50):
+            self.gossip._notify_queue.put((self._notify, "key{}".format(i)))
+        release.set()
+
+        self._stop_and_join()
+        self.assertEqual(
+            self.delivered, ["key{}".format(i) for i in range(50)])
+
+    def test_queue_drains_before_sentinel(self):
+        """Tests that notifications queued before stop are all delivered,
+        even when a notifier fails, before the thread exits.
+        """
+        def failing_notify(public_key):
+            raise RuntimeError(public_key)
+
+        self.gossip._notify_queue.put((self._notify, "key1"))
+        self.gossip._notify_queue.put((failing_notify, "key2"))
+        self.gossip._notify_queue.put((self._notify, "key3"))
+
+        self.gossip.stop()
+        self.notify_thread.start()
+        self.notify_thread.join(5)
+
+        self.assertFalse(self.notify_thread.is_alive())
+        self.assertEqual(self.delivered, ["key1", "key3"])
+        self.assertTrue(self.gossip._notify_queue.empty())
+
+    def test_stop_joins_topology_before_sentinel(self):
+        """Tests that a notification queued by the topology thread while
+        it shuts down is delivered.
+        """
+        topology = Mock()
+        topology.is_alive.return_value = True
+        topology.join.side_effect = lambda: self.gossip._notify_queue.put(
+            (self._notify, "late"))
+        self.gossip._topology = topology
+        self.notify_thread.start()
+
+        self._stop_and_join()
+        topology.stop.assert_called_once_with()
+        topology.join.assert_called_once_with()
+        self.assertEqual(self.delivered, ["late"])
+
+
+class TestBackoff(unittest.TestCase):
+
+    def test_next_backoff_bounds(self):
+        """Tests that the next backoff stays between the previous one and
+        three times it, and never exceeds the cap.
+        """
+        cap = gossip.MAXIMUM_RETRY_FREQUENCY
+        for previous in (1, 5, 10, 99, 100, 150, 299, cap):
+            for _ in range(200):
+                backoff = gossip._next_backoff(previous, cap)
+                self.assertGreaterEqual(backoff, previous)
+                self.assertLessEqual(backoff, min(cap, previous * 3))
+
+    def test_next_backoff_reaches_cap(self):
+        """Tests that repeated backoffs settle exactly on the cap, which
+        the retry loops compare against.
+        """
+        cap = gossip.MAXIMUM_STATIC_RETRY_FREQUENCY
+        backoff = gossip.INITIAL_RETRY_FREQUENCY / 2
+        for _ in range(1000):
+            backoff = gossip._next_backoff(backoff, cap)
+            if backoff == cap:
+                break
+        self.assertEqual(backoff, cap)
+
+
+class TestNonceBuffer(unittest.TestCase):
+
+    def test_nonces_are_distinct_hex(self):
+        """Tests that the buffer hands out distinct 32 character hex
+        nonces, refilling its pool once it runs out.
+        """
+        nonces = gossip._NonceBuffer(size=4 * gossip.NONCE_SIZE)
+
+        with patch.object(gossip.os, 'urandom',
+                          wraps=os.urandom) as mock_urandom:
+            values = [nonces.get() for _ in range(10)]
+
+        # 4 nonces per pool, so 10 nonces take 3 pools
+        self.assertEqual(mock_urandom.call_count, 3)
+        self.assertEqual(len(set(values)), 10)
+        for value in values:
+            self.assertEqual(len(value), 32)
+            int(value, 16)
@@ -0,0 +1,150 @@
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+# pylint: disable=protected-access
+
+import asyncio
+import unittest
+from unittest.mock import Mock
+
+import zmq
+
+from sawtooth_validator.networking.interconnect import ConnectionInfo
+from sawtooth_validator.networking.interconnect import ConnectionStatus
+from sawtooth_validator.networking.interconnect import ConnectionType
+from sawtooth_validator.networking.interconnect import Interconnect
+from sawtooth_validator.protobuf import validator_pb2
+
+
+class TestInterconnectSendMany(unittest.TestCase):
+
+    def setUp(self):
+        # The interconnect is never started, sends are captured by the
+        # mocked send/receive thread and outbound connections
+        self.interconnect = Interconnect(
+            "tcp://127.0.0.1:0", dispatcher=Mock())
+        self.mock_send_receive = Mock()
+        self.interconnect._send_receive_thread = self.mock_send_receive
+
+        self.outbound = Mock()
+        self.interconnect._connections.update({
+            "inbound1": ConnectionInfo(
+                ConnectionType.ZMQ_IDENTITY, b"identity1", None,
+                ConnectionStatus.CONNECTED, None),
+            "inbound2": ConnectionInfo(
+                ConnectionType.ZMQ_IDENTITY, b"identity2", None,
+                ConnectionStatus.CONNECTION_REQUEST, None),
+            "outbound1": ConnectionInfo(
+                ConnectionType.OUTBOUND_CONNECTION, self.outbound,
+                "tcp://outbound:8800", ConnectionStatus.CONNECTED, None),
+        })
+
+    def tearDown(self):
+        self.interconnect._future_callback_threadpool.shutdown(wait=True)
+
+    def test_send_many_returns_unknown_ids(self):
+        """Tests that send_many sends to inbound and outbound connections
+        and returns the ids it does not know.
+        """
+        failed = self.interconnect.send_many(
+            validator_pb2.Message.GOSSIP_MESSAGE,
+            b"data",
+            ["inbound1", "unknown1", "outbound1", "inbound2", "unknown2"])
+
+        self.assertEqual(failed, ["unknown1", "unknown2"])
+
+        messages = [
+            message
+            for call in self.mock_send_receive.send_messages.call_args_list
+            for message in call[0][0]]
+        self.assertEqual(
+            [connection_id for _, connection_id in messages],
+            ["inbound1", "inbound2"])
+        for message, _ in messages:
+            self.assertEqual(
+                message.message_type, validator_pb2.Message.GOSSIP_MESSAGE)
+            self.assertEqual(message.content, b"data")
+        self.assertNotEqual(
+            messages[0][0].correlation_id, messages[1][0].correlation_id)
+
+        self.outbound.send.assert_called_once_with(
+            validator_pb2.Message.GOSSIP_MESSAGE, b"data", one_way=True)
+
+    def test_send_many_batches_inbound(self):
+        """Tests that send_many hands all inbound messages to the
+        send/receive thread in a single call, and none when there are no
+        inbound messages.
+        """
+        self.interconnect.send_many(
+            validator_pb2.Message.GOSSIP_MESSAGE,
+            b"data",
+            ["inbound1", "outbound1", "inbound2"])
+
+        self.assertEqual(self.mock_send_receive.send_messages.call_count, 1)
+        messages = self.mock_send_receive.send_messages.call_args[0][0]
+        self.assertEqual(
+            [connection_id for _, connection_id in messages],
+            ["inbound1", "inbound2"])
+
+        self.mock_send_receive.reset_mock()
+        failed = self.interconnect.send_many(
+            validator_pb2.Message.GOSSIP_MESSAGE, b"data", ["unknown"])
+
+        self.assertEqual(failed, ["unknown"])
+        self.mock_send_receive.send_messages.assert_not_called()
+
+    def test_connection_ids_snapshot(self):
+        """Tests the snapshot of all connection ids."""
+        self.assertEqual(
+            self.interconnect.get_connection_ids(),
+            frozenset(["inbound1", "inbound2", "outbound1"]))
+
+    def test_handshake_complete_connection_ids_snapshot(self):
+        """Tests the snapshot of the connection ids that completed the
+        handshake.
+        """
+        self.assertEqual(
+            self.interconnect.get_handshake_complete_connection_ids(),
+            frozenset(["inbound1", "outbound1"]))
+
+
+class TestSendReceiveFrames(unittest.TestCase):
+
+    def test_failed_frame_does_not_stop_the_rest(self):
+        """Tests that a frame the socket fails to send does not keep the
+        frames after it in the same batch from being sent.
+        """
+        interconnect = Interconnect("tcp://127.0.0.1:0", dispatcher=Mock())
+        send_receive = interconnect._send_receive_thread
+        sent = []
+
+        @asyncio.coroutine
+        def send_multipart(message_frame, copy):
+            if message_frame[0] == b"bad":
+                raise zmq.error.ZMQError()
+            sent.append(message_frame)
+
+        send_receive._socket = Mock()
+        send_receive._socket.send_multipart = send_multipart
+
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(send_receive._send_message_frames(
+                [[b"first", b"1"], [b"bad", b"2"], [b"last", b"3"]]))
+        finally:
+            loop.close()
+            interconnect._future_callback_threadpool.shutdown(wait=True)
+
+        self.assertEqual(sent, [[b"first", b"1"], [b"last", b"3"]])